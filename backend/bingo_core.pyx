@@ -0,0 +1,36 @@
+# cython: language_level=3, boundscheck=False, wraparound=False
+"""C builds of main.py's two per-poll bingo checks.
+
+Build in place next to main.py:  cythonize -i bingo_core.pyx
+main.py imports this module when the extension exists and otherwise uses
+its pure-Python versions, which define the same behaviour.
+"""
+
+cdef unsigned int FREE_MASK = 1 << 12
+
+# Same order and values as main.LINE_MASKS
+cdef unsigned int[12] LINES = [
+    0x000001F, 0x00003E0, 0x0007C00, 0x00F8000, 0x1F00000,
+    0x0108421, 0x0210842, 0x0421084, 0x0842108, 0x1084210,
+    0x1041041, 0x0111110,
+]
+
+
+cpdef bint check_line_bingo(unsigned int mask):
+    cdef int k
+    for k in range(12):
+        if (mask & LINES[k]) == LINES[k]:
+            return True
+    return False
+
+
+cpdef bint marked_cells_are_valid(const unsigned char[::1] card, unsigned int mask, set draws_set):
+    """Every marked cell (except FREE) must be a number that has been drawn."""
+    cdef Py_ssize_t i = 0
+    mask &= ~FREE_MASK
+    while mask:
+        if mask & 1 and card[i] not in draws_set:
+            return False
+        mask >>= 1
+        i += 1
+    return True
@@ -0,0 +1,14 @@
+# Production entry point:  gunicorn -c gunicorn.conf.py main:app
+# UvicornWorker picks uvloop + httptools automatically when they are installed.
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Games are served from each process's memory (Redis only mirrors them), so
+# extra workers would split a game's players across diverging copies. Raise
+# WEB_CONCURRENCY only once request handling reads game state from Redis.
+workers = int(os.environ.get("WEB_CONCURRENCY", "1"))
+
+# Let open WebSockets and in-flight draws finish on redeploy.
+graceful_timeout = 30
@@ -1,21 +1,32 @@
 from __future__ import annotations
 
+import asyncio
+import logging
 import os
 import random
 import secrets
-import threading
 import time
-from typing import Dict, List, Optional
+from typing import Annotated, Any, Dict, List, Optional, Set, Tuple
 
+import orjson
+import redis.asyncio as aioredis
 import uvicorn
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, Field, ValidationError
+
+try:
+    import bingo_core  # optional C build of the hot checks: cythonize -i bingo_core.pyx
+except ImportError:
+    bingo_core = None
+
+log = logging.getLogger("bingo")
 
 # -----------------------------------------------------------------------------
 # App & CORS
 # -----------------------------------------------------------------------------
-app = FastAPI(title="Bingo Backend", version="1.0.0")
+app = FastAPI(title="Bingo Backend", version="1.0.0", default_response_class=ORJSONResponse)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # lock down to your Vercel origin if you want
@@ -25,17 +36,20 @@ app.add_middleware(
 )
 
 # -----------------------------------------------------------------------------
-# In-memory state (simple for demo; swap to Redis/DB for persistence)
+# In-memory state (mirrored to Redis when REDIS_URL is set; see Persistence)
 # -----------------------------------------------------------------------------
-lock = threading.Lock()
+# No lock: handlers, auto-draw tasks and sockets all run on the one event loop,
+# and every read-modify-write of a game happens between awaits. Keep it so.
 
 
 class PlayerState(BaseModel):
     user_id: str
     name: str
-    card: List[Optional[int]]          # 25 entries; center idx 12 = None (FREE)
-    marks: List[bool]                  # 25 booleans; idx 12 True
+    card_bytes: bytes                  # 25 numbers row by row; idx 12 = 0 (FREE)
+    marks_mask: int = 1 << 12          # bit i = cell i marked; FREE (bit 12) always set
     joined_at: float
+    bingo_key: Optional[Tuple[int, int]] = None  # (marks_mask, len(draws)) has_bingo was computed for
+    has_bingo: bool = False
 
 
 class GameState(BaseModel):
@@ -43,143 +57,556 @@ class GameState(BaseModel):
     host_id: str
     created_at: float
     draws: List[int]                   # numbers called (1..75)
+    draws_set: Set[int] = set()        # same numbers, for O(1) membership
+    draw_order: List[int] = []         # 1..75 shuffled once at creation
+    draw_cursor: int = 0               # next index into draw_order
     players: Dict[str, PlayerState]
     winner_ids: List[str]
+    winner_names: List[str] = []       # names for winner_ids, appended on claim
     closed: bool
+    version: int = 0                   # bumped whenever the shared /state part changes
+    shared: Optional[Dict[str, Any]] = None  # cached shared /state part
+    shared_version: int = -1           # version `shared` was built at
 
 
 GAMES: Dict[str, GameState] = {}
 
-# Auto-draw controller: gid -> {"stop": Event, "thread": Thread, "interval": int}
+# Auto-draw controller: gid -> {"task": asyncio.Task, "interval": int, "wake": asyncio.Event}
 AUTO: Dict[str, Dict[str, object]] = {}
 
+# Live subscribers: gid -> {user_id: WebSocket}
+SOCKETS: Dict[str, Dict[str, WebSocket]] = {}
+
 
 # -----------------------------------------------------------------------------
 # Helper functions
 # -----------------------------------------------------------------------------
-def make_card() -> List[Optional[int]]:
-    """Generate standard 5x5 Bingo card, B/I/N/G/O columns, center FREE."""
-    cols = []
-    for c in range(5):
-        pool = list(range(1 + c * 15, 1 + c * 15 + 15))
-        random.shuffle(pool)
-        cols.append(pool[:5])
-    # flatten by rows
-    card = [cols[c][r] for r in range(5) for c in range(5)]
-    card[12] = None  # FREE
-    return card
+# Bound once so card building and draw-order shuffles skip the module attribute lookup
+_sample = random.sample
+_shuffle = random.shuffle
 
+# Card cells are indexed r * 5 + c; bit i of a marks mask is cell i.
+FREE_MASK = 1 << 12
 
-def new_marks() -> List[bool]:
-    m = [False] * 25
-    m[12] = True  # FREE always marked
-    return m
-
-
-def check_line_bingo(marks: List[bool]) -> bool:
-    lines = []
+LINE_MASKS: tuple[int, ...] = (
     # rows
-    for r in range(5):
-        lines.append([r * 5 + c for c in range(5)])
+    0x000001F, 0x00003E0, 0x0007C00, 0x00F8000, 0x1F00000,
     # cols
+    0x0108421, 0x0210842, 0x0421084, 0x0842108, 0x1084210,
+    # diagonals (0, 6, 12, 18, 24) and (4, 8, 12, 16, 20)
+    0x1041041, 0x0111110,
+)
+
+
+def make_card() -> bytes:
+    """Generate standard 5x5 Bingo card, B/I/N/G/O columns, center FREE (0)."""
+    card = bytearray(25)
     for c in range(5):
-        lines.append([r * 5 + c for r in range(5)])
-    # diagonals
-    lines += [[0, 6, 12, 18, 24], [4, 8, 12, 16, 20]]
-    return any(all(marks[i] for i in line) for line in lines)
+        # partial Fisher-Yates: picks 5 of the column's 15 without shuffling all of them
+        col = _sample(range(1 + c * 15, 16 + c * 15), 5)
+        for r in range(5):
+            card[r * 5 + c] = col[r]
+    card[12] = 0  # FREE
+    return bytes(card)
+
+
+def card_list(card: bytes) -> List[Optional[int]]:
+    """Wire form of a card: 25 numbers, None for FREE."""
+    return [n or None for n in card]
+
+
+def marks_list(mask: int) -> List[bool]:
+    """Wire form of a marks mask: 25 booleans."""
+    return [bool(mask >> i & 1) for i in range(25)]
+
+
+def build_win_table() -> bytes:
+    """Bit m of the result is set iff marks mask m covers a line (2**25 bits, 4 MiB).
+
+    Built as one big int: set the 12 line bits, then for each cell b copy every
+    winning mask without bit b onto the same mask with it (a superset closure),
+    using an int selecting the positions whose bit b is clear.
+    """
+    size = 1 << 25
+    win = 0
+    for line in LINE_MASKS:
+        win |= 1 << line
+    for b in range(25):
+        step = 1 << b
+        clear = (1 << step) - 1  # runs of `step` ones every 2 * step positions
+        width = 2 * step
+        while width < size:
+            clear |= clear << width
+            width *= 2
+        win |= (win & clear) << step
+    return win.to_bytes(size // 8, "little")
+
+
+# BINGO_WIN_TABLE=0 skips the table (~0.2 s to build at import) and checks the
+# 12 line masks per call instead. Not built when bingo_core is compiled: its
+# C-level mask check beats the table lookup.
+WIN_TABLE: Optional[bytes] = (
+    build_win_table() if bingo_core is None and os.environ.get("BINGO_WIN_TABLE", "1") != "0" else None
+)
+
+if WIN_TABLE is not None:
+    def check_line_bingo(mask: int) -> bool:
+        return WIN_TABLE[mask >> 3] >> (mask & 7) & 1 == 1
+else:
+    def check_line_bingo(mask: int) -> bool:
+        # LINE_MASKS unrolled: no generator, short-circuits on the first full line
+        m = mask
+        return (
+            (m & 0x000001F) == 0x000001F or (m & 0x00003E0) == 0x00003E0
+            or (m & 0x0007C00) == 0x0007C00 or (m & 0x00F8000) == 0x00F8000
+            or (m & 0x1F00000) == 0x1F00000 or (m & 0x0108421) == 0x0108421
+            or (m & 0x0210842) == 0x0210842 or (m & 0x0421084) == 0x0421084
+            or (m & 0x0842108) == 0x0842108 or (m & 0x1084210) == 0x1084210
+            or (m & 0x1041041) == 0x1041041 or (m & 0x0111110) == 0x0111110
+        )
 
 
-def marked_cells_are_valid(card: List[Optional[int]], marks: List[bool], draws: List[int]) -> bool:
+def marked_cells_are_valid(card: bytes, mask: int, draws_set: Set[int]) -> bool:
     """Every marked cell (except FREE) must be a number that has been drawn."""
-    for i, m in enumerate(marks):
-        if not m:
-            continue
-        if i == 12:  # FREE
-            continue
-        v = card[i]
-        if v is None:
-            continue
-        if v not in draws:
+    mask &= ~FREE_MASK
+    i = 0
+    while mask:
+        if mask & 1 and card[i] not in draws_set:
             return False
+        mask >>= 1
+        i += 1
     return True
 
 
-def remaining_numbers(draws: List[int]) -> List[int]:
-    return [n for n in range(1, 76) if n not in draws]
+if bingo_core is not None:
+    # same behaviour as the Python versions above, compiled
+    check_line_bingo = bingo_core.check_line_bingo  # noqa: F811
+    marked_cells_are_valid = bingo_core.marked_cells_are_valid  # noqa: F811
+
+
+def new_draw_order() -> List[int]:
+    order = list(range(1, 76))
+    _shuffle(order)
+    return order
+
+
+def draw_next(g: GameState) -> Optional[int]:
+    """Call the next number from the game's pre-shuffled order (None when exhausted)."""
+    if g.draw_cursor >= len(g.draw_order):
+        return None
+    nxt = g.draw_order[g.draw_cursor]
+    g.draw_cursor += 1
+    g.draws.append(nxt)
+    g.draws_set.add(nxt)
+    g.version += 1
+    return nxt
+
+
+def shared_state(g: GameState) -> Dict[str, Any]:
+    """Caller-independent part of /state, rebuilt only when g.version moves."""
+    if g.shared is None or g.shared_version != g.version:
+        g.shared = {
+            "game_id": g.game_id,
+            "host_id": g.host_id,
+            "draw_count": len(g.draws),
+            "players_count": len(g.players),
+            "winner_ids": g.winner_ids,
+            "winner_names": g.winner_names,
+            "closed": g.closed,
+        }
+        g.shared_version = g.version
+    return g.shared
+
+
+def player_has_bingo(g: GameState, p: PlayerState) -> bool:
+    """Valid marks + a full line; cached until the player's marks or the draws change."""
+    key = (p.marks_mask, len(g.draws))
+    if p.bingo_key != key:
+        p.has_bingo = marked_cells_are_valid(p.card_bytes, p.marks_mask, g.draws_set) and check_line_bingo(p.marks_mask)
+        p.bingo_key = key
+    return p.has_bingo
+
+
+def state_payload(g: GameState, user_id: str, last_draw_index: int) -> Dict[str, Any]:
+    """Full /state response for one caller (card/marks only if they joined)."""
+    # draws are append-only: send only the tail the client hasn't seen
+    # (all of them if its index is ahead of this game, e.g. after a switch)
+    start = last_draw_index if last_draw_index <= len(g.draws) else 0
+    res = shared_state(g) | {"new_draws": g.draws[start:], "is_host": user_id == g.host_id,
+                             "card": None, "marks": None, "has_bingo": False}
+    # include the caller's card/marks
+    p = g.players.get(user_id)
+    if p:
+        res["card"] = card_list(p.card_bytes)
+        res["marks"] = marks_list(p.marks_mask)
+        res["has_bingo"] = player_has_bingo(g, p)
+    return res
+
+
+def apply_mark(p: PlayerState, index: int, marked: bool) -> None:
+    if index != 12:  # FREE always marked
+        bit = 1 << index
+        p.marks_mask = (p.marks_mask | bit) if marked else (p.marks_mask & ~bit)
+
+
+def record_claim(g: GameState, p: PlayerState) -> bool:
+    """Check p's bingo and record them as a winner; the first winner closes the game."""
+    valid = player_has_bingo(g, p)
+    if valid and p.user_id not in g.winner_ids:
+        g.winner_ids.append(p.user_id)
+        g.winner_names.append(p.name)
+        g.version += 1
+        # ⬇️ NEW: end game on first winner
+        if len(g.winner_ids) == 1:
+            g.closed = True
+    return valid
 
 
 # -----------------------------------------------------------------------------
 # Auto-draw worker
 # -----------------------------------------------------------------------------
-def _auto_draw_loop(gid: str):
-    """Background loop that draws a number every interval seconds."""
-    while True:
-        with lock:
+async def _auto_draw_loop(gid: str):
+    """Background task that draws a number every interval seconds."""
+    try:
+        while True:
             info = AUTO.get(gid)
             g = GAMES.get(gid)
             if not info or not g or g.closed:
                 # game gone or stopped
-                AUTO.pop(gid, None)
                 return
-            stop: threading.Event = info["stop"]  # type: ignore
-            interval: int = int(info.get("interval", 5))  # type: ignore
-
-        if stop.wait(timeout=max(2, interval)):
-            # stop signaled
-            with lock:
-                AUTO.pop(gid, None)
-            return
-
-        with lock:
+            interval = int(info.get("interval", 5))  # type: ignore
+            wake: asyncio.Event = info["wake"]  # type: ignore
+
+            try:
+                await asyncio.wait_for(wake.wait(), timeout=max(2, interval))
+            except asyncio.TimeoutError:
+                pass
+            else:
+                # retuned: restart the wait with the new interval
+                wake.clear()
+                continue
+
+            if not await hold_auto_lease(gid, interval):
+                continue  # another process is drawing for this game
             g = GAMES.get(gid)
-            if not g:
-                AUTO.pop(gid, None)
-                return
-            if len(g.draws) >= 75:
-                AUTO.pop(gid, None)
+            nxt = draw_next(g) if g and not g.closed else None
+            if nxt is None:
                 return
-            rem = remaining_numbers(g.draws)
-            if not rem:
-                AUTO.pop(gid, None)
-                return
-            nxt = random.choice(rem)
-            g.draws.append(nxt)
+            await announce_draw(gid, g, nxt)
+    finally:
+        # a stop + restart may already have replaced our entry; only drop our own
+        info = AUTO.get(gid)
+        if info and info["task"] is asyncio.current_task():
+            AUTO.pop(gid, None)
 
 
 def start_auto_draw(gid: str, interval: int = 5):
-    with lock:
-        if gid in AUTO:
-            # update interval
-            AUTO[gid]["interval"] = interval
-            return
-        stop = threading.Event()
-        t = threading.Thread(target=_auto_draw_loop, args=(gid,), daemon=True)
-        AUTO[gid] = {"stop": stop, "thread": t, "interval": interval}
-        t.start()
+    """Start (or retune) the game's auto-draw task. Must run on the event loop."""
+    if gid in AUTO:
+        # update interval; wake the task so it applies now, not after the old wait
+        AUTO[gid]["interval"] = interval
+        AUTO[gid]["wake"].set()  # type: ignore
+        return
+    AUTO[gid] = {"interval": interval, "wake": asyncio.Event()}
+    AUTO[gid]["task"] = asyncio.create_task(_auto_draw_loop(gid))
 
 
 def stop_auto_draw(gid: str):
-    with lock:
-        info = AUTO.get(gid)
-        if info:
-            stop: threading.Event = info["stop"]  # type: ignore
-            stop.set()
+    info = AUTO.pop(gid, None)
+    if info:
+        info["task"].cancel()  # type: ignore
 
 
 def stop_all_auto():
-    with lock:
-        for info in list(AUTO.values()):
-            stop: threading.Event = info["stop"]  # type: ignore
-            stop.set()
-        AUTO.clear()
+    for info in AUTO.values():
+        info["task"].cancel()  # type: ignore
+    AUTO.clear()
+
+
+# -----------------------------------------------------------------------------
+# Persistence (optional Redis mirror)
+# -----------------------------------------------------------------------------
+# GAMES stays the source of truth for request handling; every mutation is also
+# written through to Redis so games survive restarts and redeploys.
+#   game:{gid}          hash  host_id, created_at, draw_order, draw_cursor,
+#                             winner_ids, closed, auto (interval, 0 = off)
+#   game:{gid}:players  hash  uid -> {"name", "card", "joined_at"} JSON
+#   game:{gid}:marks    hash  uid -> marks_mask
+#   games               set   all game ids
+# Draws are not stored separately: they are draw_order[:draw_cursor].
+REDIS_URL = os.environ.get("REDIS_URL", "")
+GAME_TTL_S = 24 * 3600
+AUTO_LEASE_SLACK_S = 5             # auto-draw lease outlives the draw interval by this much
+INSTANCE_ID = secrets.token_hex(8)  # this process, as recorded in auto-draw leases
+
+REDIS: Optional[aioredis.Redis] = None
+
+# save_game writes all of these; a game:{gid} hash missing any of them was
+# recreated by a field update after expiry and is treated as gone
+_GAME_FIELDS = ("host_id", "created_at", "draw_order", "draw_cursor", "winner_ids", "closed")
+
+
+def _game_key(gid: str) -> str:
+    return f"game:{gid}"
+
+
+def _pipeline() -> Optional[aioredis.client.Pipeline]:
+    return REDIS.pipeline(transaction=False) if REDIS is not None else None
+
+
+# gid -> [writes started, writes finished]. Every change to a game is followed,
+# with no await in between, by its write through _flush, so with Redis on this
+# also counts changes; _reload_game uses it to spot ones racing a reload.
+_WRITES: Dict[str, List[int]] = {}
+
+
+async def _flush(gid: str, pipe: aioredis.client.Pipeline) -> None:
+    """Refresh the game's TTL and send the queued writes in one round trip."""
+    for key in (_game_key(gid), f"game:{gid}:players", f"game:{gid}:marks"):
+        pipe.expire(key, GAME_TTL_S)
+    writes = _WRITES.setdefault(gid, [0, 0])
+    writes[0] += 1
+    try:
+        await pipe.execute()
+    except aioredis.RedisError as e:
+        # persistence is best effort; in-memory play continues
+        log.warning("redis write for game %s failed: %s", gid, e)
+    finally:
+        writes[1] += 1
+
+
+def _player_json(p: PlayerState) -> bytes:
+    return orjson.dumps({"name": p.name, "card": card_list(p.card_bytes), "joined_at": p.joined_at})
+
+
+async def save_game(g: GameState) -> None:
+    pipe = _pipeline()
+    if pipe is None:
+        return
+    auto = AUTO.get(g.game_id)
+    pipe.sadd("games", g.game_id)
+    pipe.hset(_game_key(g.game_id), mapping={
+        "host_id": g.host_id,
+        "created_at": g.created_at,
+        "draw_order": ",".join(map(str, g.draw_order)),
+        "draw_cursor": g.draw_cursor,
+        "winner_ids": orjson.dumps(g.winner_ids),
+        "closed": int(g.closed),
+        "auto": int(auto["interval"]) if auto else 0,  # type: ignore
+    })
+    pipe.hset(f"game:{g.game_id}:players", mapping={uid: _player_json(p) for uid, p in g.players.items()})
+    pipe.hset(f"game:{g.game_id}:marks", mapping={uid: p.marks_mask for uid, p in g.players.items()})
+    await _flush(g.game_id, pipe)
+
+
+async def save_game_fields(gid: str, **fields) -> None:
+    pipe = _pipeline()
+    if pipe is None:
+        return
+    pipe.hset(_game_key(gid), mapping=fields)
+    await _flush(gid, pipe)
+
+
+async def save_player(gid: str, p: PlayerState) -> None:
+    pipe = _pipeline()
+    if pipe is None:
+        return
+    pipe.hset(f"game:{gid}:players", p.user_id, _player_json(p))
+    pipe.hset(f"game:{gid}:marks", p.user_id, p.marks_mask)
+    await _flush(gid, pipe)
+
+
+async def save_marks(gid: str, p: PlayerState) -> None:
+    pipe = _pipeline()
+    if pipe is None:
+        return
+    pipe.hset(f"game:{gid}:marks", p.user_id, p.marks_mask)
+    await _flush(gid, pipe)
+
+
+# Extend the lease only while we still own it; GET then EXPIRE could extend a
+# lease another process took in between
+_RENEW_LEASE_LUA = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("EXPIRE", KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# Take a free lease and record the taker as the game's auto_owner, which
+# outlives the lease. Returns the previous auto_owner ("" if none), or nil if
+# another process holds the lease.
+_TAKE_LEASE_LUA = """
+if not redis.call("SET", KEYS[1], ARGV[1], "NX", "EX", ARGV[2]) then
+    return false
+end
+local prev = redis.call("HGET", KEYS[2], "auto_owner")
+if redis.call("EXISTS", KEYS[2]) == 1 then
+    redis.call("HSET", KEYS[2], "auto_owner", ARGV[1])
+end
+return prev or ""
+"""
+
+_RELOAD_TRIES = 3
+
+
+async def hold_auto_lease(gid: str, interval: int) -> bool:
+    """Whether this process should make the game's next auto-draw (always, without Redis).
+
+    More than one process can hold a game, e.g. old and new instances overlapping
+    during a redeploy. The auto:{gid}:leader lease lets only one of them draw.
+    A process taking the lease over from another one first reloads the game from
+    Redis, since that one may have drawn, taken marks or closed it meanwhile.
+    """
+    if REDIS is None:
+        return True
+    key = f"auto:{gid}:leader"
+    ttl = interval + AUTO_LEASE_SLACK_S
+    try:
+        if await REDIS.eval(_RENEW_LEASE_LUA, 1, key, INSTANCE_ID, ttl):
+            return True
+        prev = await REDIS.eval(_TAKE_LEASE_LUA, 2, key, _game_key(gid), INSTANCE_ID, ttl)
+        if prev is None:
+            return False
+        if prev in ("", INSTANCE_ID):
+            # the game's first lease, or ours lapsed with nobody else drawing
+            return True
+        g = await _reload_game(gid)
+    except (aioredis.RedisError, KeyError, ValueError) as e:
+        # can't coordinate; keep the game moving locally
+        log.warning("auto-draw lease for game %s failed: %s", gid, e)
+        return True
+    return not (g and g.closed)  # on a closed game the loop sees it and stops
+
+
+async def _reload_game(gid: str) -> Optional[GameState]:
+    """Replace GAMES[gid] with the Redis copy, unless the local game changes meanwhile.
+
+    A join or mark landing on the local copy during the load would be lost with
+    it, so the swap only happens when none of the game's writes were in flight
+    when the load started and none started before it finished. Otherwise it
+    tries again once they have landed, and in the end keeps the local copy.
+    """
+    writes = _WRITES.setdefault(gid, [0, 0])
+    for _ in range(_RELOAD_TRIES):
+        started = writes[0]
+        if writes[1] != started:
+            await asyncio.sleep(0.05)
+            continue
+        fresh = await _load_game(gid)
+        if writes[0] != started:
+            continue
+        old = GAMES.get(gid)
+        if fresh is None:
+            return old
+        fresh.version = (old.version + 1) if old else 0
+        GAMES[gid] = fresh
+        return fresh
+    log.warning("game %s kept changing during reload; keeping the local copy", gid)
+    return GAMES.get(gid)
+
+
+async def _load_game(gid: str) -> Optional[GameState]:
+    assert REDIS is not None
+    # one MULTI/EXEC, so the three hashes come from the same moment
+    pipe = REDIS.pipeline(transaction=True)
+    pipe.hgetall(_game_key(gid))
+    pipe.hgetall(f"game:{gid}:players")
+    pipe.hgetall(f"game:{gid}:marks")
+    meta, players_raw, marks_raw = await pipe.execute()
+    if not all(f in meta for f in _GAME_FIELDS):
+        return None
+
+    draw_order = [int(n) for n in meta["draw_order"].split(",")]
+    draw_cursor = int(meta["draw_cursor"])
+    draws = draw_order[:draw_cursor]
+    players: Dict[str, PlayerState] = {}
+    for uid, raw in players_raw.items():
+        d = orjson.loads(raw)
+        mask = int(marks_raw.get(uid, FREE_MASK))
+        players[uid] = PlayerState(
+            user_id=uid,
+            name=d["name"],
+            card_bytes=bytes(n or 0 for n in d["card"]),
+            marks_mask=mask,
+            joined_at=d["joined_at"],
+        )
+    winner_ids = orjson.loads(meta["winner_ids"])
+    return GameState(
+        game_id=gid,
+        host_id=meta["host_id"],
+        created_at=float(meta["created_at"]),
+        draws=draws,
+        draws_set=set(draws),
+        draw_order=draw_order,
+        draw_cursor=draw_cursor,
+        players=players,
+        winner_ids=winner_ids,
+        winner_names=[players[uid].name for uid in winner_ids if uid in players],
+        closed=meta["closed"] == "1",
+    )
+
+
+async def restore_games() -> None:
+    """Load every persisted game into GAMES and resume auto-draw where it was on."""
+    assert REDIS is not None
+    for gid in await REDIS.smembers("games"):
+        try:
+            g = await _load_game(gid)
+            if g is None:
+                # expired (or only partially recreated since)
+                await REDIS.srem("games", gid)
+                continue
+            interval = int(await REDIS.hget(_game_key(gid), "auto") or 0)
+        except (aioredis.RedisError, KeyError, ValueError) as e:
+            # one bad game must not keep the rest (or the app) from starting
+            log.warning("could not restore game %s: %s", gid, e)
+            continue
+        GAMES[gid] = g
+        if interval and not g.closed:
+            start_auto_draw(gid, interval=interval)
+
+
+# -----------------------------------------------------------------------------
+# Live updates (WebSocket push)
+# -----------------------------------------------------------------------------
+async def broadcast(gid: str, msg: Dict[str, Any]) -> None:
+    """Send msg to every socket subscribed to the game; drop the ones that fail."""
+    subs = SOCKETS.get(gid)
+    if not subs:
+        return
+    data = orjson.dumps(msg).decode()
+    items = list(subs.items())
+    results = await asyncio.gather(*(ws.send_text(data) for _, ws in items), return_exceptions=True)
+    for (uid, ws), r in zip(items, results):
+        if isinstance(r, Exception) and subs.get(uid) is ws:
+            del subs[uid]
+
+
+async def announce_draw(gid: str, g: GameState, nxt: int) -> None:
+    await save_game_fields(gid, draw_cursor=g.draw_cursor)
+    await broadcast(gid, {"op": "draw", "n": nxt, "draw_count": len(g.draws)})
+
+
+async def announce_win(gid: str, g: GameState) -> None:
+    # no awaits before stop_auto_draw: the game is closed and must not draw again
+    stop_auto_draw(gid)
+    await save_game_fields(gid, winner_ids=orjson.dumps(g.winner_ids), closed=int(g.closed), auto=0)
+    await broadcast(gid, {"op": "winners", "winner_ids": g.winner_ids,
+                          "winner_names": g.winner_names, "closed": g.closed})
 
 
 # -----------------------------------------------------------------------------
 # Request/Response models
 # -----------------------------------------------------------------------------
+# Over-long or odd ids/names are rejected with a 422 at parse time, not trimmed
+UserId = Annotated[str, Field(max_length=128, pattern=r"^[\w.-]+$")]
+PlayerName = Annotated[str, Field(max_length=64)]
+
+
 class CreateGameReq(BaseModel):
-    host_id: str
-    host_name: str
+    host_id: UserId
+    host_name: PlayerName
 
 
 class CreateGameRes(BaseModel):
@@ -187,46 +614,27 @@ class CreateGameRes(BaseModel):
 
 
 class JoinReq(BaseModel):
-    user_id: str
-    name: str
+    user_id: UserId
+    name: PlayerName
 
 
 class StateReq(BaseModel):
-    user_id: str
-
-
-class StateRes(BaseModel):
-    game_id: str
-    host_id: str
-    draws: List[int]
-    players_count: int
-    winner_ids: List[str]
-    winner_names: List[str] = []     # NEW: names for all winners
-    closed: bool
-    is_host: bool
-    card: Optional[List[Optional[int]]] = None
-    marks: Optional[List[bool]] = None
-    has_bingo: bool = False
+    user_id: UserId
+    last_draw_index: int = Field(0, ge=0)  # draws the client already has
 
 
 class MarkReq(BaseModel):
-    user_id: str
+    user_id: UserId
     index: int = Field(ge=0, le=24)
     marked: bool
 
 
 class ClaimReq(BaseModel):
-    user_id: str
-
-
-class ClaimRes(BaseModel):
-    valid: bool
-    winner_ids: List[str]
-    winner_names: List[str] = []     # NEW: names echoed after claim
+    user_id: UserId
 
 
 class AutoReq(BaseModel):
-    user_id: str
+    user_id: UserId
     on: bool
     interval: int = Field(5, ge=2, le=60)
 
@@ -235,162 +643,228 @@ class AutoReq(BaseModel):
 # Endpoints
 # -----------------------------------------------------------------------------
 @app.post("/games", response_model=CreateGameRes)
-def create_game(req: CreateGameReq):
+async def create_game(req: CreateGameReq):
     """Create a game; host auto-joins; auto-draw starts (every 5s)."""
-    with lock:
-        gid = secrets.token_urlsafe(6)
-        GAMES[gid] = GameState(
-            game_id=gid,
-            host_id=req.host_id,
-            created_at=time.time(),
-            draws=[],
-            players={},
-            winner_ids=[],
-            closed=False,
-        )
-        # host joins
-        GAMES[gid].players[req.host_id] = PlayerState(
-            user_id=req.host_id,
-            name=req.host_name[:64],
-            card=make_card(),
-            marks=new_marks(),
-            joined_at=time.time(),
-        )
-    # start auto-draw outside lock
+    gid = secrets.token_urlsafe(6)
+    GAMES[gid] = GameState(
+        game_id=gid,
+        host_id=req.host_id,
+        created_at=time.time(),
+        draws=[],
+        draw_order=new_draw_order(),
+        players={},
+        winner_ids=[],
+        closed=False,
+    )
+    # host joins
+    GAMES[gid].players[req.host_id] = PlayerState(
+        user_id=req.host_id,
+        name=req.host_name,
+        card_bytes=make_card(),
+        joined_at=time.time(),
+    )
     start_auto_draw(gid, interval=5)
+    await save_game(GAMES[gid])
     return CreateGameRes(game_id=gid)
 
 
 @app.post("/games/{gid}/join")
-def join_game(gid: str, req: JoinReq):
-    with lock:
-        g = GAMES.get(gid)
-        if not g or g.closed:
-            raise HTTPException(status_code=404, detail="Game not found or closed")
-        if len(g.players) >= 400 and req.user_id not in g.players:
-            raise HTTPException(status_code=403, detail="Game is full (400)")
-        if req.user_id not in g.players:
-            g.players[req.user_id] = PlayerState(
-                user_id=req.user_id,
-                name=req.name[:64],
-                card=make_card(),
-                marks=new_marks(),
-                joined_at=time.time(),
-            )
+async def join_game(gid: str, req: JoinReq):
+    g = GAMES.get(gid)
+    if not g or g.closed:
+        raise HTTPException(status_code=404, detail="Game not found or closed")
+    if len(g.players) >= 400 and req.user_id not in g.players:
+        raise HTTPException(status_code=403, detail="Game is full (400)")
+    if req.user_id not in g.players:
+        p = g.players[req.user_id] = PlayerState(
+            user_id=req.user_id,
+            name=req.name,
+            card_bytes=make_card(),
+            joined_at=time.time(),
+        )
+        g.version += 1
+        await save_player(gid, p)
+        await broadcast(gid, {"op": "players", "players_count": len(g.players)})
     return {"ok": True}
 
 
 @app.post("/games/{gid}/draw")
-def draw_number(gid: str, user_id: str):
+async def draw_number(gid: str, user_id: str):
     """Manual draw (still available); only host can call."""
-    with lock:
-        g = GAMES.get(gid)
-        if not g or g.closed:
-            raise HTTPException(status_code=404, detail="Game not found or closed")
-        if user_id != g.host_id:
-            raise HTTPException(status_code=403, detail="Only host can draw")
-        if len(g.draws) >= 75:
-            raise HTTPException(status_code=400, detail="All numbers drawn")
-        rem = remaining_numbers(g.draws)
-        if not rem:
-            raise HTTPException(status_code=400, detail="No numbers remaining")
-        nxt = random.choice(rem)
-        g.draws.append(nxt)
-        return {"next_number": nxt, "draws": g.draws}
+    g = GAMES.get(gid)
+    if not g or g.closed:
+        raise HTTPException(status_code=404, detail="Game not found or closed")
+    if user_id != g.host_id:
+        raise HTTPException(status_code=403, detail="Only host can draw")
+    nxt = draw_next(g)
+    if nxt is None:
+        raise HTTPException(status_code=400, detail="All numbers drawn")
+    await announce_draw(gid, g, nxt)
+    return {"next_number": nxt, "draws": g.draws}
 
 
 @app.post("/games/{gid}/mark")
-def mark_cell(gid: str, req: MarkReq):
-    with lock:
-        g = GAMES.get(gid)
-        if not g:
-            raise HTTPException(404, "Game not found")
-         if g.closed:                                  
-            raise HTTPException(400, "Game has ended")
-             
-        p = g.players.get(req.user_id)
-        if not p:
-            raise HTTPException(404, "Player not in game")
-        if req.index == 12:
-            p.marks[12] = True  # FREE always marked
-        else:
-            p.marks[req.index] = bool(req.marked)
+async def mark_cell(gid: str, req: MarkReq):
+    g = GAMES.get(gid)
+    if not g:
+        raise HTTPException(404, "Game not found")
+    if g.closed:
+        raise HTTPException(400, "Game has ended")
+
+    p = g.players.get(req.user_id)
+    if not p:
+        raise HTTPException(404, "Player not in game")
+    apply_mark(p, req.index, req.marked)
+    await save_marks(gid, p)
     return {"ok": True}
 
 
-@app.post("/games/{gid}/state", response_model=StateRes)
-def get_state(gid: str, req: StateReq):
-    with lock:
-        g = GAMES.get(gid)
-        if not g:
-            raise HTTPException(404, "Game not found")
-        is_host = req.user_id == g.host_id
-        res = StateRes(
-            game_id=g.game_id,
-            host_id=g.host_id,
-            draws=list(g.draws),
-            players_count=len(g.players),
-            winner_ids=list(g.winner_ids),
-            closed=g.closed,
-            is_host=is_host,
-        )
-        # fill winner names
-        res.winner_names = [g.players[uid].name for uid in g.winner_ids if uid in g.players]
-        # include the caller's card/marks
-        p = g.players.get(req.user_id)
-        if p:
-            res.card = p.card
-            res.marks = p.marks
-            res.has_bingo = marked_cells_are_valid(p.card, p.marks, g.draws) and check_line_bingo(p.marks)
-        return res
+# /state and /claim hand back an ORJSONResponse themselves, which skips
+# FastAPI's jsonable_encoder walk over the payload
+@app.post("/games/{gid}/state")
+async def get_state(gid: str, req: StateReq):
+    g = GAMES.get(gid)
+    if not g:
+        raise HTTPException(404, "Game not found")
+    return ORJSONResponse(state_payload(g, req.user_id, req.last_draw_index))
 
 
-@app.post("/games/{gid}/claim", response_model=ClaimRes)
-def claim_bingo(gid: str, req: ClaimReq):
-    with lock:
-        g = GAMES.get(gid)
-        if not g or g.closed:
-            raise HTTPException(404, "Game not found or closed")
-        p = g.players.get(req.user_id)
-        if not p:
-            raise HTTPException(404, "Player not in game")
-
-        valid = marked_cells_are_valid(p.card, p.marks, g.draws) and check_line_bingo(p.marks)
-        if valid and req.user_id not in g.winner_ids:
-            g.winner_ids.append(req.user_id)
-            # ⬇️ NEW: end game on first winner
-            if len(g.winner_ids) == 1:
-                g.closed = True
-    # stop auto-draw outside the lock to avoid deadlocks
+@app.post("/games/{gid}/claim")
+async def claim_bingo(gid: str, req: ClaimReq):
+    g = GAMES.get(gid)
+    if not g or g.closed:
+        raise HTTPException(404, "Game not found or closed")
+    p = g.players.get(req.user_id)
+    if not p:
+        raise HTTPException(404, "Player not in game")
+
+    valid = record_claim(g, p)
     if valid:
-        stop_auto_draw(gid)
+        await announce_win(gid, g)
 
-    with lock:
-        names = [g.players[uid].name for uid in g.winner_ids if uid in g.players]
-        return ClaimRes(valid=valid, winner_ids=list(g.winner_ids), winner_names=names)
+    return ORJSONResponse({"valid": valid, "winner_ids": g.winner_ids, "winner_names": g.winner_names})
 
 @app.post("/games/{gid}/auto")
-def set_auto_draw(gid: str, req: AutoReq):
+async def set_auto_draw(gid: str, req: AutoReq):
     """Toggle/adjust auto-draw. Only host may call."""
-    with lock:
-        g = GAMES.get(gid)
-        if not g:
-            raise HTTPException(404, "Game not found")
-        if req.user_id != g.host_id:
-            raise HTTPException(403, "Only host can change auto-draw")
+    g = GAMES.get(gid)
+    if not g:
+        raise HTTPException(404, "Game not found")
+    if req.user_id != g.host_id:
+        raise HTTPException(403, "Only host can change auto-draw")
     if req.on:
         start_auto_draw(gid, interval=req.interval)
     else:
         stop_auto_draw(gid)
+    await save_game_fields(gid, auto=req.interval if req.on else 0)
     return {"ok": True, "on": req.on, "interval": req.interval}
 
 
 # -----------------------------------------------------------------------------
-# Graceful shutdown (stop all auto threads)
+# WebSocket: one connection per player instead of polling
 # -----------------------------------------------------------------------------
+# Connect to /ws/{gid}?user_id=... after joining over REST. The server sends
+# {"op": "state", ...} (same fields as /state) on connect, then pushes
+#   {"op": "draw", "n", "draw_count"}, {"op": "players", "players_count"},
+#   {"op": "winners", "winner_ids", "winner_names", "closed"}.
+# Client ops and their replies:
+#   {"op": "mark", "i", "v"}          -> {"op": "marks", "marks", "has_bingo"}
+#   {"op": "claim"}                   -> {"op": "claim", "valid", "winner_ids", "winner_names"}
+#   {"op": "state", "last_draw_index"} -> {"op": "state", ...}
+# Bad input gets {"op": "error", "detail"} and the socket stays open.
+async def _ws_op(gid: str, user_id: str, msg: Dict[str, Any]) -> Dict[str, Any]:
+    # look the game up per message: an auto-draw lease takeover may replace GAMES[gid]
+    g = GAMES.get(gid)
+    p = g.players.get(user_id) if g else None
+    if not p:
+        return {"op": "error", "detail": "Game or player not found"}
+    op = msg.get("op")
+    if op == "mark":
+        req = MarkReq(user_id=p.user_id, index=msg.get("i"), marked=msg.get("v"))
+        if g.closed:
+            return {"op": "error", "detail": "Game has ended"}
+        apply_mark(p, req.index, req.marked)
+        res = {"op": "marks", "marks": marks_list(p.marks_mask), "has_bingo": player_has_bingo(g, p)}
+        await save_marks(gid, p)
+        return res
+    if op == "claim":
+        if g.closed:
+            return {"op": "error", "detail": "Game has ended"}
+        valid = record_claim(g, p)
+        if valid:
+            await announce_win(gid, g)
+        return {"op": "claim", "valid": valid, "winner_ids": g.winner_ids,
+                "winner_names": g.winner_names}
+    if op == "state":
+        req = StateReq(user_id=p.user_id, last_draw_index=msg.get("last_draw_index", 0))
+        return {"op": "state"} | state_payload(g, p.user_id, req.last_draw_index)
+    return {"op": "error", "detail": f"Unknown op: {op!r}"}
+
+
+@app.websocket("/ws/{gid}")
+async def game_socket(ws: WebSocket, gid: str, user_id: str):
+    g = GAMES.get(gid)
+    p = g.players.get(user_id) if g else None
+    await ws.accept()
+    if not p:
+        # join over REST first. Accept before closing: closing during the
+        # handshake becomes an HTTP 403 and browsers only see 1006
+        await ws.close(code=4404)
+        return
+    subs = SOCKETS.setdefault(gid, {})
+    subs[user_id] = ws
+    try:
+        hello = {"op": "state"} | state_payload(g, user_id, 0)
+        await ws.send_text(orjson.dumps(hello).decode())
+        while True:
+            frame = await ws.receive()
+            if frame["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(frame.get("code", 1000))
+            try:
+                # receive_text() would raise KeyError on a binary frame and
+                # drop the connection; answer it like any other bad message
+                if frame.get("text") is None:
+                    raise ValueError("expected a text frame")
+                msg = orjson.loads(frame["text"])
+                if not isinstance(msg, dict):
+                    raise ValueError("message must be a JSON object")
+                res = await _ws_op(gid, user_id, msg)
+            except (ValueError, ValidationError) as e:  # orjson.JSONDecodeError is a ValueError
+                res = {"op": "error", "detail": str(e)}
+            await ws.send_text(orjson.dumps(res).decode())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        if subs.get(user_id) is ws:
+            del subs[user_id]
+        if not subs and SOCKETS.get(gid) is subs:
+            del SOCKETS[gid]
+
+
+# -----------------------------------------------------------------------------
+# Startup (reload persisted games) & graceful shutdown (cancel auto-draw tasks)
+# -----------------------------------------------------------------------------
+@app.on_event("startup")
+async def _startup():
+    global REDIS
+    if not REDIS_URL:
+        return
+    pool = aioredis.ConnectionPool.from_url(REDIS_URL, max_connections=50, decode_responses=True)
+    REDIS = aioredis.Redis(connection_pool=pool)
+    try:
+        await restore_games()
+    except aioredis.RedisError as e:
+        # persistence is best effort: boot with no restored games
+        log.warning("restoring games from redis failed: %s", e)
+
+
 @app.on_event("shutdown")
-def _shutdown():
+async def _shutdown():
+    global REDIS
     stop_all_auto()
+    if REDIS is not None:
+        await REDIS.aclose()
+        REDIS = None
 
 
 # -----------------------------------------------------------------------------
@@ -398,6 +872,9 @@ def _shutdown():
 # -----------------------------------------------------------------------------
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", "8000"))
-    uvicorn.run("main:app", host="0.0.0.0", port=port, reload=False)
+    # loop="auto" picks uvloop where it is installed (not on Windows/PyPy); httptools is the C HTTP
+    # parser. State is in-process, so one worker
+    uvicorn.run("main:app", host="0.0.0.0", port=port, reload=False,
+                loop="auto", http="httptools", workers=1)
 
 